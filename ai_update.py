@@ -0,0 +1,422 @@
+# ai_update.py — artımlı (online) model güncelleme
+# Sadece son checkpoint'ten sonra gelen olayları okur; her döngünün maliyeti
+# toplam geçmişten bağımsızdır (yeni satır sayısı + sabit pencere + sabit ağaç sayısı).
+#
+# Ufuk: ölçek istatistikleri son --sketch-rows NORMAL satırı (varsayılan 5000),
+# ağaçlar son --window satırdaki NORMAL'leri yansıtır; eski veri unutulur.
+#
+#   python ai_update.py                    # tek güncelleme döngüsü
+#   python ai_update.py --loop 300         # 5 dakikada bir güncelle
+#   python ai_update.py --replace-frac 0.1 --window 5000 --keep 10
+import json, os, time, math, pickle, argparse, shutil
+from pathlib import Path
+from collections import deque
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+DATA_DIR = Path("data")
+SRC = DATA_DIR / "events.jsonl"
+BUNDLE = DATA_DIR / "ai_model.joblib"          # server.py'nin yüklediği dosya
+VERSIONS_DIR = DATA_DIR / "models"             # ai_model_v0001.joblib, ...
+STATE = DATA_DIR / "ai_update_state.pkl"       # checkpoint
+
+REQUIRED = ("voltage","current","power_kw","energy_kwh","temp_c","ts","seq")
+
+
+# ====== P² (P-square) akan yüzdelik tahmini ======
+class P2Quantile:
+    """
+    Jain & Chlamtac P² algoritması: tek bir yüzdeliği 5 işaretçi ile,
+    veriyi saklamadan O(1) bellek/güncelleme ile tahmin eder.
+    """
+    def __init__(self, p: float):
+        self.p = p
+        self.init = []                                  # ilk 5 gözlem
+        self.q = None                                   # işaretçi yükseklikleri
+        self.n = None                                   # işaretçi konumları
+        self.np = None                                  # istenen konumlar
+        self.dn = [0.0, p/2, p, (1+p)/2, 1.0]
+
+    def add(self, x: float):
+        if self.q is None:
+            self.init.append(x)
+            if len(self.init) == 5:
+                self.init.sort()
+                self.q = list(self.init)
+                self.n = [0, 1, 2, 3, 4]
+                p = self.p
+                self.np = [0.0, 2*p, 4*p, 2 + 2*p, 4.0]
+                self.init = []
+            return
+
+        q, n = self.q, self.n
+        if x < q[0]:
+            q[0] = x; k = 0
+        elif x >= q[4]:
+            q[4] = x; k = 3
+        else:
+            k = 0
+            while x >= q[k+1]:
+                k += 1
+        for i in range(k+1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        # orta işaretçileri ayarla
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i+1] - n[i] > 1) or (d <= -1 and n[i-1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                qp = self._parabolic(i, s)
+                if not (q[i-1] < qp < q[i+1]):
+                    qp = q[i] + s * (q[i+s] - q[i]) / (n[i+s] - n[i])
+                q[i] = qp
+                n[i] += s
+
+    def _parabolic(self, i, s):
+        q, n = self.q, self.n
+        return q[i] + s / (n[i+1] - n[i-1]) * (
+            (n[i] - n[i-1] + s) * (q[i+1] - q[i]) / (n[i+1] - n[i]) +
+            (n[i+1] - n[i] - s) * (q[i] - q[i-1]) / (n[i] - n[i-1])
+        )
+
+    def value(self) -> float:
+        if self.q is not None:
+            return self.q[2]
+        if not self.init:
+            return 0.0
+        return float(np.percentile(self.init, self.p * 100))
+
+    def to_dict(self) -> dict:
+        return {"p": self.p, "init": list(self.init), "q": self.q, "n": self.n, "np": self.np}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        est = cls(d["p"])
+        est.init, est.q, est.n, est.np = d["init"], d["q"], d["n"], d["np"]
+        return est
+
+
+class RobustSketch:
+    """Her özellik için (q_low, medyan, q_high) P² tahmincileri."""
+    def __init__(self, n_features: int, quantile_range=(25.0, 75.0)):
+        lo, hi = quantile_range
+        self.qs = [[P2Quantile(lo/100), P2Quantile(0.5), P2Quantile(hi/100)]
+                   for _ in range(n_features)]
+        self.count = 0
+
+    def add(self, x):
+        for j, v in enumerate(x):
+            for est in self.qs[j]:
+                est.add(float(v))
+        self.count += 1
+
+    def center_scale(self):
+        center = np.array([q[1].value() for q in self.qs], dtype=float)
+        scale = np.array([q[2].value() - q[0].value() for q in self.qs], dtype=float)
+        # RobustScaler sabit kolonlarda ölçeği 1 yapar; P² enterpolasyonu
+        # tam 0 yerine çok küçük bir fark bırakabildiği için toleranslı kontrol
+        scale[scale <= 1e-6 * np.maximum(1.0, np.abs(center))] = 1.0
+        return center, scale
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "qs": [[e.to_dict() for e in q] for q in self.qs]}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        sk = cls(0)
+        sk.count = d["count"]
+        sk.qs = [[P2Quantile.from_dict(e) for e in q] for q in d["qs"]]
+        return sk
+
+
+class RollingRobustSketch:
+    """
+    İki kuşaklı sketch: `horizon` NORMAL satırda bir aktif sketch emekliye ayrılır,
+    yenisi başlar. Sonuç, önceki kuşak dolan yeniye göre azalan ağırlıkla
+    harmanlanarak hesaplanır; böylece istatistikler yaklaşık son `horizon`
+    satırı yansıtır ve kuşak değişiminde sıçramaz.
+    """
+    def __init__(self, n_features: int, quantile_range=(25.0, 75.0), horizon: int = 5000):
+        self.n_features = n_features
+        self.quantile_range = quantile_range
+        self.horizon = horizon
+        self.active = RobustSketch(n_features, quantile_range)
+        self.prev = None
+
+    @property
+    def count(self):
+        return self.active.count + (self.prev.count if self.prev else 0)
+
+    def add(self, x):
+        if self.active.count >= self.horizon:
+            self.prev = self.active
+            self.active = RobustSketch(self.n_features, self.quantile_range)
+        self.active.add(x)
+
+    def center_scale(self):
+        if self.prev is None or self.prev.count < 5:
+            return self.active.center_scale()
+        if self.active.count < 5:
+            return self.prev.center_scale()
+        w = min(1.0, self.active.count / self.horizon)
+        c_new, s_new = self.active.center_scale()
+        c_old, s_old = self.prev.center_scale()
+        return w * c_new + (1 - w) * c_old, w * s_new + (1 - w) * s_old
+
+    def to_dict(self) -> dict:
+        return {
+            "n_features": self.n_features,
+            "quantile_range": tuple(self.quantile_range),
+            "horizon": self.horizon,
+            "active": self.active.to_dict(),
+            "prev": self.prev.to_dict() if self.prev else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        sk = cls(d["n_features"], d["quantile_range"], d["horizon"])
+        sk.active = RobustSketch.from_dict(d["active"])
+        sk.prev = RobustSketch.from_dict(d["prev"]) if d["prev"] else None
+        return sk
+
+
+# ====== Gerçek zamanlı özellikler (server.py / ai_prepare.py ile aynı) ======
+def conn_features(st: dict, p: dict) -> dict:
+    ts_ms, power, energy = p["ts"], p["power_kw"], p["energy_kwh"]
+    dt = d_power = d_energy = 0.0
+    if st.get("prev_ts") is not None:
+        dt = max(1, ts_ms - st["prev_ts"])
+        d_power = power - st["prev_power"]
+        d_energy = energy - st["prev_energy"]
+
+    win = st.setdefault("pow_win", deque(maxlen=3))
+    win.append(power)
+    power_ma3 = sum(win) / len(win)
+    if len(win) > 1:
+        power_std3 = math.sqrt(sum((x - power_ma3)**2 for x in win) / len(win))
+    else:
+        power_std3 = 0.0
+    power_z = 0.0 if power_std3 == 0 else (power - power_ma3) / power_std3
+
+    st["prev_ts"], st["prev_power"], st["prev_energy"] = ts_ms, power, energy
+    return {
+        "voltage": p["voltage"], "current": p["current"], "power_kw": power,
+        "energy_kwh": energy, "temp_c": p["temp_c"], "enc": int(bool(p.get("enc"))),
+        "dt": dt, "d_power": d_power, "d_energy": d_energy,
+        "power_ma3": power_ma3, "power_z": power_z,
+    }
+
+
+# ====== Checkpoint ======
+def load_state(bundle, window: int, sketch_rows: int) -> dict:
+    scaler = bundle["scaler"]
+    qrange = getattr(scaler, "quantile_range", (25.0, 75.0))
+    if STATE.exists():
+        with STATE.open("rb") as f:
+            st = pickle.load(f)
+        st["recent"] = deque(st["recent"], maxlen=window)
+        st["sketch"] = RollingRobustSketch.from_dict(st["sketch"])
+        st["sketch"].horizon = sketch_rows
+        return st
+    # İlk çalıştırma: log'un tamamı bir kez taranır (tek seferlik bootstrap)
+    return {
+        "offset": 0,
+        "conns": {},
+        "sketch": RollingRobustSketch(len(bundle["features"]), qrange, sketch_rows),
+        "recent": deque(maxlen=window),     # (x, is_anomaly) — son pencere
+        "tree_cursor": 0,
+        "version": bundle.get("version", 0),
+    }
+
+
+def save_state(st: dict):
+    # sketch düz veri olarak yazılır; checkpoint script'e (__main__) bağlı kalmaz
+    data = dict(st, sketch=st["sketch"].to_dict())
+    tmp = STATE.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp, STATE)
+
+
+# ====== Yeni olayları oku ======
+def consume(st: dict, feat: list) -> int:
+    """Checkpoint ofsetinden itibaren events.jsonl'ı okur, sketch ve pencereyi günceller."""
+    if not SRC.exists():
+        return 0
+    if SRC.stat().st_size < st["offset"]:
+        # log döndürülmüş/kısaltılmış; baştan oku
+        st["offset"], st["conns"] = 0, {}
+
+    n_new = 0
+    with SRC.open("rb") as f:
+        f.seek(st["offset"])
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if not line.endswith(b"\n"):
+                break                       # yarım satır; sonraki döngüde okunur
+            st["offset"] = f.tell()
+            try:
+                obj = json.loads(line)
+            except:
+                continue
+            typ, cid = obj.get("type"), obj.get("conn_id")
+            if typ == "CONNECT":
+                st["conns"][cid] = {}
+                continue
+            if typ == "DISCONNECT":
+                st["conns"].pop(cid, None)
+                continue
+            if typ != "METRICS":
+                continue
+            p = obj.get("payload") or {}
+            if not all(k in p for k in REQUIRED):
+                continue
+
+            row = conn_features(st["conns"].setdefault(cid, {}), p)
+            x = np.array([float(row.get(k, 0.0)) for k in feat], dtype=float)
+            # sadece kural kodları: modelin kendi AI_DETECTED işaretleri NORMAL sayılır,
+            # yoksa eşiğin altındaki ~%12 her döngüde eğitimden düşer (geri besleme)
+            is_anom = any(isinstance(a, dict) and a.get("code") != "AI_DETECTED"
+                          for a in (obj.get("anomalies") or []))
+            if not is_anom:
+                st["sketch"].add(x)         # ölçek istatistikleri sadece NORMAL'den
+            st["recent"].append((x, is_anom))
+            n_new += 1
+    return n_new
+
+
+# ====== Orman yenileme ======
+_TREE_ATTRS = ("estimators_", "estimators_features_", "_seeds",
+               "_average_path_length_per_tree", "_decision_path_lengths")
+
+def replace_trees(model, fresh, start: int) -> int:
+    """model içindeki ağaçları fresh'in ağaçlarıyla döngüsel (en eski önce) değiştirir."""
+    total = len(model.estimators_)
+    k = len(fresh.estimators_)
+    idx = [(start + i) % total for i in range(k)]
+    for attr in _TREE_ATTRS:
+        if not (hasattr(model, attr) and hasattr(fresh, attr)):
+            continue
+        old, new = getattr(model, attr), getattr(fresh, attr)
+        if isinstance(old, np.ndarray):
+            old = old.copy()
+        else:
+            old = list(old)
+        for i, j in enumerate(idx):
+            old[j] = new[i]
+        setattr(model, attr, old)
+    return (start + k) % total
+
+
+def update(bundle, st: dict, replace_frac: float, min_rows: int, seed: int):
+    feat = bundle["features"]
+    scaler, model = bundle["scaler"], bundle["model"]
+
+    # 1) RobustScaler istatistiklerini sketch'ten güncelle
+    if st["sketch"].count >= 5:
+        scaler.center_, scaler.scale_ = st["sketch"].center_scale()
+
+    recent = list(st["recent"])
+    X_norm = np.array([x for x, a in recent if not a])
+    # score_samples tüm yol uzunluklarını orijinal ormanın _max_samples'ı ile
+    # normalize eder; daha az örnekle kurulan (sığ) ağaçlar ormana uymaz
+    min_rows = max(min_rows, model.max_samples_)
+    if len(X_norm) < min_rows:
+        print(f"[update] only {len(X_norm)} NORMAL rows in window (< {min_rows}); trees unchanged")
+    else:
+        # 2) Ağaçların bir kısmını son NORMAL pencere üzerinde yeniden eğit
+        k = max(1, int(round(len(model.estimators_) * replace_frac)))
+        fresh = IsolationForest(
+            n_estimators=k,
+            max_samples=model.max_samples_,
+            contamination=model.contamination,
+            random_state=seed,
+        ).fit(scaler.transform(X_norm))
+        st["tree_cursor"] = replace_trees(model, fresh, st["tree_cursor"])
+        print(f"[update] replaced {k}/{len(model.estimators_)} trees on {len(X_norm)} rows")
+
+    # 3) Eşiği son pencere üzerinden yeniden hesapla (ai_model.py ile aynı yüzdelik)
+    if recent:
+        X_all = np.array([x for x, _ in recent])
+        scores = model.decision_function(scaler.transform(X_all))
+        pct = model.contamination * 100 if isinstance(model.contamination, float) else 12
+        bundle["threshold"] = float(np.percentile(scores, pct))
+
+
+def write_bundle(bundle, version: int, keep: int) -> Path:
+    VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    bundle["version"] = version
+    bundle["updated_at"] = time.time()
+    out = VERSIONS_DIR / f"ai_model_v{version:04d}.joblib"
+    with out.open("wb") as f:
+        pickle.dump(bundle, f)
+    # server.py dosya değişimini görüp yeniden yükler; yarım dosya görmemesi için atomik
+    tmp = BUNDLE.with_suffix(".tmp")
+    shutil.copyfile(out, tmp)
+    os.replace(tmp, BUNDLE)
+
+    # eski sürümleri sil; en yeni `keep` tanesi kalır
+    if keep > 0:
+        olds = sorted(VERSIONS_DIR.glob("ai_model_v*.joblib"),
+                      key=lambda f: int(f.stem.rsplit("_v", 1)[1]))
+        for old in olds[:-keep]:
+            try:
+                old.unlink()
+            except OSError as e:
+                print(f"[update] could not remove {old}: {e}")
+    return out
+
+
+def run_once(args) -> bool:
+    with BUNDLE.open("rb") as f:
+        bundle = pickle.load(f)
+    st = load_state(bundle, args.window, args.sketch_rows)
+
+    t0 = time.time()
+    n_new = consume(st, bundle["features"])
+    if n_new == 0:
+        save_state(st)
+        print("[update] no new METRICS since last checkpoint")
+        return False
+
+    st["version"] = max(st["version"], bundle.get("version", 0)) + 1
+    update(bundle, st, args.replace_frac, args.min_rows, seed=st["version"])
+    out = write_bundle(bundle, st["version"], args.keep)
+    save_state(st)          # bundle yazıldıktan sonra checkpoint ilerlesin
+    print(f"[OK] {n_new} new rows -> {out} ({time.time()-t0:.2f}s)")
+    return True
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--replace-frac", type=float, default=0.1,
+                    help="her döngüde yenilenecek ağaç oranı")
+    ap.add_argument("--window", type=int, default=5000,
+                    help="yeniden eğitim için tutulan son satır sayısı")
+    ap.add_argument("--sketch-rows", type=int, default=5000,
+                    help="ölçek istatistiklerinin ufku (NORMAL satır)")
+    ap.add_argument("--min-rows", type=int, default=256,
+                    help="ağaç yenilemek için gereken en az NORMAL satır (en az max_samples_)")
+    ap.add_argument("--keep", type=int, default=10,
+                    help="data/models altında saklanacak son sürüm sayısı (0 = hepsi)")
+    ap.add_argument("--loop", type=float, default=0,
+                    help="saniye; >0 ise sürekli çalışır")
+    args = ap.parse_args()
+    if not 0 < args.replace_frac <= 1:
+        ap.error("--replace-frac must be in (0, 1]")
+
+    if args.loop > 0:
+        while True:
+            try:
+                run_once(args)
+            except Exception as e:
+                # yarım yazılmış/eksik bundle vb.; checkpoint ilerlemedi, sonraki turda tekrar denenir
+                print(f"[update] cycle error: {e!r}")
+            time.sleep(args.loop)
+    else:
+        run_once(args)
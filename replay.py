@@ -0,0 +1,226 @@
+# replay.py — kayıtlı METRICS trafiğini server.py'ye hızlandırılmış olarak yeniden oynatır
+#
+#   python replay.py                                 # data/events.jsonl, orijinal hız
+#   python replay.py --speed 100                     # 100x
+#   python replay.py --speed max --copies 20         # beklemesiz, her oturumdan 20 kopya
+#   python replay.py --src data/events.csv --speed 10
+#
+# JSONL kaynağında sunucunun kaydettiği ACK/STOP_CHARGE kararları ile canlı
+# sunucunun kararları karşılaştırılır; uyuşmazlık varsa çıkış kodu 1'dir.
+import asyncio
+import json
+import csv
+import time
+import argparse
+from pathlib import Path
+from collections import Counter
+import websockets
+
+HOST, PORT = "localhost", 8765
+
+# Sunucunun payload'a eklediği türev alanlar; istasyon bunları göndermez
+ENRICHED = ("dt", "d_power", "d_energy", "power_ma3", "power_z")
+
+
+class Session:
+    def __init__(self, key: str):
+        self.key = key
+        self.handshake = []      # (t, type, payload) — AUTH / FIRMWARE / START
+        self.metrics = []        # (t, payload, expected_action | None)
+        self.stop = None         # t; istasyon STOP göndermiş mi
+
+
+# ====== Kaynak okuma ======
+def load_jsonl(path: Path):
+    sessions, current = [], {}
+    n = 0
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except:
+                continue
+            cid, typ, ts = obj.get("conn_id"), obj.get("type"), obj.get("ts")
+            if ts is None:
+                continue
+            # conn_id sunucu yeniden başlayınca tekrar 1'den başlar; oturumu CONNECT ayırır
+            if typ == "CONNECT" or cid not in current:
+                n += 1
+                current[cid] = Session(f"{n}:conn{cid}")
+                sessions.append(current[cid])
+                if typ == "CONNECT":
+                    continue
+            s = current[cid]
+            if typ in ("AUTH", "FIRMWARE", "START"):
+                s.handshake.append((ts, typ, obj.get("payload") or {}))
+            elif typ == "METRICS":
+                p = {k: v for k, v in (obj.get("payload") or {}).items() if k not in ENRICHED}
+                s.metrics.append((ts, p, obj.get("action")))
+            elif typ == "STOP":
+                s.stop = ts
+            elif typ == "DISCONNECT":
+                current.pop(cid, None)
+    return [s for s in sessions if s.metrics]
+
+
+def load_csv(path: Path):
+    # CSV'de oturum sınırı ve karar yok: seq geri sarınca yeni oturum, karar kontrolü yapılmaz
+    sessions, current, prev_seq = [], {}, {}
+    with path.open(newline="") as f:
+        for r in csv.DictReader(f):
+            cid, seq = r["conn_id"], int(r["seq"])
+            if cid not in current or seq <= prev_seq[cid]:
+                current[cid] = Session(f"{len(sessions)+1}:conn{cid}")
+                sessions.append(current[cid])
+            prev_seq[cid] = seq
+            p = {
+                "ts": int(float(r["ts_ms"])),
+                "voltage": float(r["voltage"]),
+                "current": float(r["current"]),
+                "power_kw": float(r["power_kw"]),
+                "energy_kwh": float(r["energy_kwh"]),
+                "temp_c": float(r["temp_c"]),
+                "enc": bool(int(r["enc"])),
+                "seq": seq,
+            }
+            current[cid].metrics.append((float(r["ts_server"]), p, None))
+    return sessions
+
+
+# ====== Oynatma ======
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.checked = 0
+        self.skipped = 0         # oturum bittikten/ayrıştıktan sonra gönderilmeyen kayıtlar
+        self.mismatches = []     # (session, seq, expected, got)
+        self.latencies = []      # s
+        self.actions = Counter()
+
+
+async def play(s: Session, t_origin: float, t0: float, speed: float,
+               sem: asyncio.Semaphore, stats: Stats, timeout: float):
+    def at(t):
+        # kayıttaki t anının oynatmadaki karşılığına kadar bekle
+        if speed == 0:
+            return asyncio.sleep(0)
+        delay = t0 + (t - t_origin) / speed - time.perf_counter()
+        return asyncio.sleep(max(0.0, delay))
+
+    async with sem:
+        uri = f"ws://{HOST}:{PORT}"
+        async with websockets.connect(uri, max_queue=None) as ws:
+            handshake = s.handshake or [
+                (s.metrics[0][0], "AUTH", {"token": "demo-token"}),
+                (s.metrics[0][0], "FIRMWARE", {"version": "1.2.3"}),
+                (s.metrics[0][0], "START", {}),
+            ]
+            for t, typ, payload in handshake:
+                await at(t)
+                await ws.send(json.dumps({"type": typ, "payload": payload}))
+
+            closed = diverged = False
+            for i, (t, payload, expected) in enumerate(s.metrics):
+                seq = payload.get("seq")
+                await at(t)
+                sent_at = time.perf_counter()
+                try:
+                    await ws.send(json.dumps({"type": "METRICS", "payload": payload}))
+                    stats.sent += 1
+                    data = json.loads(await asyncio.wait_for(ws.recv(), timeout=timeout))
+                    stats.latencies.append(time.perf_counter() - sent_at)
+                    if data.get("type") == "CMD" and data.get("cmd") == "STOP_CHARGE":
+                        got = "STOP_CHARGE"
+                        closed = True
+                    elif data.get("type") == "ACK":
+                        got = "ACK"
+                    else:
+                        got = str(data.get("type"))
+                except asyncio.TimeoutError:
+                    # geç gelen yanıt bir sonraki recv()'e düşer ve kararlar kayar;
+                    # oturumu burada bitir
+                    got, closed = "TIMEOUT", True
+                except websockets.ConnectionClosed:
+                    got, closed = "CLOSED", True
+                stats.actions[got] += 1
+                if expected is not None:
+                    stats.checked += 1
+                    if got != expected:
+                        # oturum başına sadece ilk ayrışma raporlanır
+                        stats.mismatches.append((s.key, seq, expected, got))
+                        diverged = True
+                if closed or diverged:
+                    # kalan kayıtlar gönderilmez (eski sunucu sürümleri STOP_CHARGE
+                    # sonrası bağlantıyı açık tutuyordu; bunlar da buraya düşer)
+                    stats.skipped += len(s.metrics) - i - 1
+                    break
+
+            if s.stop is not None and not (closed or diverged):
+                await at(s.stop)
+                await ws.send(json.dumps({"type": "STOP", "payload": {}}))
+
+
+async def run(args):
+    src = Path(args.src)
+    sessions = load_csv(src) if src.suffix == ".csv" else load_jsonl(src)
+    if args.session:
+        sessions = [s for s in sessions if s.key in args.session]
+    if not sessions:
+        print(f"[replay] no METRICS sessions in {src}")
+        return 1
+
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    n_msgs = sum(len(s.metrics) for s in sessions) * args.copies
+    print(f"[replay] {len(sessions)} sessions x{args.copies}, {n_msgs} METRICS, "
+          f"speed={args.speed}, align={args.align}")
+
+    stats = Stats()
+    sem = asyncio.Semaphore(args.concurrency)
+    first = min(s.metrics[0][0] if not s.handshake else s.handshake[0][0] for s in sessions)
+    t0 = time.perf_counter()
+    tasks = []
+    for s in sessions:
+        # original: oturumlar arası boşluklar korunur; start: hepsi aynı anda başlar
+        start = s.handshake[0][0] if s.handshake else s.metrics[0][0]
+        origin = first if args.align == "original" else start
+        for _ in range(args.copies):
+            tasks.append(play(s, origin, t0, speed, sem, stats, args.timeout))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    for e in errors[:5]:
+        print(f"[replay] session error: {e!r}")
+
+    lat = sorted(stats.latencies)
+    def pct(p):
+        return lat[min(len(lat) - 1, int(p / 100 * len(lat)))] * 1000 if lat else 0.0
+    print(f"[replay] sent {stats.sent} METRICS in {elapsed:.2f}s "
+          f"({stats.sent / elapsed if elapsed else 0:.0f} msg/s)")
+    print(f"[replay] latency p50={pct(50):.1f}ms p99={pct(99):.1f}ms max={pct(100):.1f}ms")
+    print(f"[replay] actions: {dict(stats.actions)}")
+
+    if stats.checked:
+        print(f"[replay] decisions: {stats.checked - len(stats.mismatches)}/{stats.checked} match"
+              f" ({stats.skipped} recorded after session end or first mismatch, not sent)")
+        for key, seq, exp, got in stats.mismatches[:20]:
+            print(f"[!] session {key} seq={seq}: recorded {exp}, got {got}")
+    else:
+        print("[replay] no recorded decisions in source; decision check skipped")
+    return 1 if (stats.mismatches or errors) else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--src", default="data/events.jsonl", help="events.jsonl veya events.csv")
+    ap.add_argument("--speed", default="1", help="hızlandırma katsayısı (10, 100, ...) veya 'max'")
+    ap.add_argument("--align", default="start", choices=["start", "original"],
+                    help="start: tüm oturumlar aynı anda başlar; original: kayıttaki aralıklar korunur")
+    ap.add_argument("--copies", type=int, default=1, help="her oturum için eşzamanlı bağlantı sayısı")
+    ap.add_argument("--concurrency", type=int, default=1000, help="en fazla açık bağlantı")
+    ap.add_argument("--session", action="append", help="sadece bu oturum(lar)ı oynat, örn. 3:conn1")
+    ap.add_argument("--timeout", type=float, default=5.0, help="yanıt bekleme süresi (s)")
+    args = ap.parse_args()
+    if args.speed != "max" and float(args.speed) <= 0:
+        ap.error("--speed must be > 0 or 'max'")
+    raise SystemExit(asyncio.run(run(args)))
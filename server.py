@@ -24,15 +24,45 @@ import numpy as np
 import pickle
 
 AI_MODEL_PATH = os.path.join(LOG_DIR, "ai_model.joblib")
+AI_RELOAD_EVERY = 5.0  # s; ai_update.py yeni bundle yazınca otomatik yükle
 ai_bundle = None
-if os.path.exists(AI_MODEL_PATH):
+_ai_mtime = None
+
+def read_ai_bundle():
+    """Bundle'ı diskten okur; (bundle, mtime) döner. Hata durumunda (None, None)."""
     try:
+        mtime = os.path.getmtime(AI_MODEL_PATH)
         with open(AI_MODEL_PATH, "rb") as f:
-            ai_bundle = pickle.load(f)  # {"scaler","model","threshold","features"}
-        print("[AI] model bundle loaded")
+            bundle = pickle.load(f)  # {"scaler","model","threshold","features"[,"version"]}
+        return bundle, mtime
     except Exception as e:
         print(f"[AI] load error: {e}")
-        ai_bundle = None
+        return None, None
+
+async def watch_ai_bundle():
+    """
+    ai_model.joblib değişince yeni bundle'ı thread'de yükleyip referansı değiştirir.
+    pickle.load event loop dışında çalışır; açık bağlantılar beklemez.
+    """
+    global ai_bundle, _ai_mtime
+    while True:
+        await asyncio.sleep(AI_RELOAD_EVERY)
+        try:
+            mtime = os.path.getmtime(AI_MODEL_PATH)
+        except OSError:
+            continue
+        if mtime == _ai_mtime:
+            continue
+        bundle, mtime = await asyncio.to_thread(read_ai_bundle)
+        if bundle is not None:
+            # yükleme başarısızsa eldeki model kullanılmaya devam eder
+            ai_bundle, _ai_mtime = bundle, mtime
+            print(f"[AI] model bundle reloaded (version {bundle.get('version', 0)})")
+
+if os.path.exists(AI_MODEL_PATH):
+    ai_bundle, _ai_mtime = read_ai_bundle()
+    if ai_bundle is not None:
+        print(f"[AI] model bundle loaded (version {ai_bundle.get('version', 0)})")
 else:
     print("[AI] model bundle not found; running rule-based only")
 
@@ -257,6 +287,7 @@ async def handle(ws):
 
 # ====== main ======
 async def main():
+    reloader = asyncio.create_task(watch_ai_bundle())
     async with serve(handle, HOST, PORT):
         print(f"CSMS listening on ws://{HOST}:{PORT}")
         print(f"Logging to {LOG_FILE}")